@@ -5,6 +5,9 @@ import os
 import math
 import argparse
 import csv
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -37,7 +40,8 @@ FIELDS_TO_REQUEST = [
     "rating", "user_ratings_total", "price_level", "reviews" 
 ]
 # Generate the 'fields' parameter string
-FIELDS_PARAM = ",".join(field.split('/')[0] for field in FIELDS_TO_REQUEST) # Only need top-level field name for API
+# Only need top-level field name for API; sub-fields of the same parent collapse to one entry
+FIELDS_PARAM = ",".join(dict.fromkeys(field.split('/')[0] for field in FIELDS_TO_REQUEST))
 
 # Define the headers for the output CSV file (flattened structure)
 CSV_HEADERS = [
@@ -48,43 +52,142 @@ CSV_HEADERS = [
     "opening_hours_json", "current_opening_hours_json", "reviews_json"
 ]
 
-# Delay between API calls to be courteous and avoid hitting rapid rate limits
+# Minimum delay between the starts of consecutive API calls, enforced across all workers,
+# to be courteous and avoid hitting rapid rate limits (0.1s = at most 10 requests/second)
 API_DELAY_SECONDS = 0.1 # Adjust as needed, increase if facing rate issues
 
+# Number of Place Details requests kept in flight at once
+MAX_WORKERS = 5
+
+# On-disk cache of Place Details responses, one JSON file per Place ID
+CACHE_DIR = "place_details_cache"
+CACHE_TTL_SECONDS = 7 * 24 * 3600  # Re-fetch cached details older than a week
+
 # --- Argument Parser ---
 parser = argparse.ArgumentParser(description="Fetch Place Details for a list of Place IDs and save to CSV.")
 parser.add_argument("input_file", help="Path to the text file containing Place IDs (one per line).")
 parser.add_argument("-o", "--output-file", default=None,
                     help="Path to the output CSV file (default: details_summary_TIMESTAMP.csv).")
+parser.add_argument("--skip-reviews", action="store_true",
+                    help="Do not request reviews (much smaller responses; reviews_json will be empty).")
+parser.add_argument("-w", "--workers", type=int, default=MAX_WORKERS,
+                    help=f"Number of concurrent requests (default: {MAX_WORKERS}).")
+parser.add_argument("--refresh", action="store_true",
+                    help=f"Ignore cached details in {CACHE_DIR}/ and fetch everything again.")
 args = parser.parse_args()
 
 # --- Helper Functions ---
 
+# Each worker thread keeps its own HTTP session (requests.Session is not thread-safe)
+_thread_local = threading.local()
+
+def get_http_session():
+    """Return the calling thread's HTTP session, reusing its keep-alive connection."""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _thread_local.session = session
+    return session
+
 def get_place_details(api_key, place_id, fields_param):
-    """Fetch details for a single Place ID."""
+    """Fetch details for a single Place ID.
+
+    Returns (result, None) on success or (None, error_message) on failure, so the
+    caller can report errors in order instead of worker threads printing them.
+    """
     params = {
         "place_id": place_id,
         "fields": fields_param,
         "key": api_key
     }
     try:
-        response = requests.get(PLACE_DETAILS_URL, params=params)
+        response = get_http_session().get(PLACE_DETAILS_URL, params=params)
         data = response.json()
         if data.get("status") == "OK":
-            return data.get("result")
+            return data.get("result"), None
         else:
-            print(f"Error fetching details for {place_id}: {data.get('status')} - {data.get('error_message', 'No error message')}")
-            return None
+            return None, f"{data.get('status')} - {data.get('error_message', 'No error message')}"
     except requests.exceptions.RequestException as e:
-        print(f"Network error fetching details for {place_id}: {e}")
-        return None
+        return None, f"Network error: {e}"
     except json.JSONDecodeError:
-        print(f"JSON decode error fetching details for {place_id}. Response text: {response.text[:100]}...")
+        return None, f"JSON decode error. Response text: {response.text[:100]}..."
+
+def read_cache_entry(place_id):
+    """Return the fresh cache entry ({"fields", "result"}) for a Place ID, or None."""
+    cache_file = os.path.join(CACHE_DIR, f"{place_id}.json")
+    try:
+        if time.time() - os.path.getmtime(cache_file) > CACHE_TTL_SECONDS:
+            return None
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def load_cached_details(place_id, fields_param):
+    """Return cached details for a Place ID if fresh and fetched with at least the requested fields.
+
+    Entries fetched with more fields (e.g. a full run when --skip-reviews is requested)
+    are reused, trimmed to the requested fields so the output matches a fresh fetch.
+    """
+    cached = read_cache_entry(place_id)
+    if not cached:
+        return None
+    requested_fields = set(fields_param.split(","))
+    if not requested_fields <= set(cached.get("fields", "").split(",")):
         return None
+    result = cached.get("result") or {}
+    return {key: value for key, value in result.items() if key in requested_fields}
+
+def save_cached_details(place_id, fields_param, details):
+    """Store fetched details so later runs can skip the API call.
+
+    A fresh entry fetched with more fields is kept rather than replaced by a smaller response.
+    """
+    cached = read_cache_entry(place_id)
+    if cached and set(fields_param.split(",")) < set(cached.get("fields", "").split(",")):
+        return
+    cache_file = os.path.join(CACHE_DIR, f"{place_id}.json")
+    try:
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({"fields": fields_param, "result": details}, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"Warning: could not cache details for {place_id}: {e}")
+
+# Shared pacing state so all workers together respect API_DELAY_SECONDS
+_rate_lock = threading.Lock()
+_next_request_time = 0.0
+
+def wait_for_request_slot():
+    """Block until API_DELAY_SECONDS have passed since the previous request started."""
+    global _next_request_time
+    with _rate_lock:
+        now = time.monotonic()
+        wait = _next_request_time - now
+        _next_request_time = max(now, _next_request_time) + API_DELAY_SECONDS
+    if wait > 0:
+        time.sleep(wait)
+
+def fetch_details_paced(place_id, fields_param):
+    """Fetch details for a single Place ID, pacing API calls across all workers.
+
+    Cached details are returned without calling the API unless --refresh is set.
+    Returns (result, error_message) like get_place_details.
+    """
+    if not args.refresh:
+        details = load_cached_details(place_id, fields_param)
+        if details:
+            return details, None
+
+    wait_for_request_slot()
+    details, error = get_place_details(API_KEY, place_id, fields_param)
+    if details:
+        save_cached_details(place_id, fields_param, details)
+    return details, error
 
 def flatten_place_data(place_data, headers):
     """Flatten the nested JSON data from Place Details into a dictionary for CSV."""
-    flat_data = {}
+    # Start from a row with every header present, so missing data stays empty
+    flat_data = dict.fromkeys(headers, "")
 
     # Direct mapping for simple fields
     flat_data["place_id"] = place_data.get("place_id", "")
@@ -101,10 +204,12 @@ def flatten_place_data(place_data, headers):
     # Note: utc_offset_minutes appears to be unsupported by the current API despite documentation
 
     # Nested fields
-    flat_data["lat"] = place_data.get("geometry", {}).get("location", {}).get("lat", "")
-    flat_data["lng"] = place_data.get("geometry", {}).get("location", {}).get("lng", "")
-    flat_data["plus_code_compound"] = place_data.get("plus_code", {}).get("compound_code", "")
-    flat_data["plus_code_global"] = place_data.get("plus_code", {}).get("global_code", "")
+    location = place_data.get("geometry", {}).get("location", {})
+    plus_code = place_data.get("plus_code", {})
+    flat_data["lat"] = location.get("lat", "")
+    flat_data["lng"] = location.get("lng", "")
+    flat_data["plus_code_compound"] = plus_code.get("compound_code", "")
+    flat_data["plus_code_global"] = plus_code.get("global_code", "")
 
     # Array/Object fields (serialize to JSON string or join)
     flat_data["types"] = "|".join(place_data.get("types", []))
@@ -112,11 +217,6 @@ def flatten_place_data(place_data, headers):
     flat_data["opening_hours_json"] = json.dumps(place_data.get("opening_hours", {}), ensure_ascii=False)
     flat_data["current_opening_hours_json"] = json.dumps(place_data.get("current_opening_hours", {}), ensure_ascii=False)
     flat_data["reviews_json"] = json.dumps(place_data.get("reviews", []), ensure_ascii=False)
-    
-    # Ensure all headers exist in the output dict, even if data was missing
-    for header in headers:
-        if header not in flat_data:
-            flat_data[header] = ""
             
     return flat_data
 
@@ -131,15 +231,24 @@ def main():
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_file = f"place_details_summary_{timestamp}.csv"
 
-    # Read Place IDs from input file
+    # Read Place IDs from input file, skipping duplicates (each would cost a paid request)
     place_ids_to_fetch = []
+    seen_ids = set()
+    duplicate_count = 0
     try:
         with open(input_file, 'r') as f:
             for line in f:
                 place_id = line.strip()
-                if place_id: # Ignore empty lines
-                    place_ids_to_fetch.append(place_id)
+                if not place_id: # Ignore empty lines
+                    continue
+                if place_id in seen_ids:
+                    duplicate_count += 1
+                    continue
+                seen_ids.add(place_id)
+                place_ids_to_fetch.append(place_id)
         print(f"Read {len(place_ids_to_fetch)} Place IDs from {input_file}")
+        if duplicate_count:
+            print(f"Skipped {duplicate_count} duplicate Place IDs")
     except FileNotFoundError:
         print(f"Error: Input file not found at {input_file}")
         return
@@ -157,31 +266,59 @@ def main():
     error_count = 0
     start_time = time.time()
 
-    print(f"Requesting fields: {FIELDS_PARAM}")
+    fields_param = FIELDS_PARAM
+    if args.skip_reviews:
+        # Reviews dominate the response size; drop them when not needed
+        fields_param = ",".join(field for field in FIELDS_PARAM.split(",") if field != "reviews")
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    print(f"Requesting fields: {fields_param}")
     print(f"Outputting to: {output_file}")
+    print(f"Concurrent requests: {max(1, args.workers)}")
 
+    workers = max(1, args.workers)
     try:
-        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile, \
+                ThreadPoolExecutor(max_workers=workers) as executor:
             writer = csv.DictWriter(csvfile, fieldnames=CSV_HEADERS)
             writer.writeheader()
 
-            for place_id in place_ids_to_fetch:
-                print(f"Processing {processed_count + 1}/{total_ids}: {place_id} ... ", end='', flush=True)
-                
-                details = get_place_details(API_KEY, place_id, FIELDS_PARAM)
-
-                if details:
-                    flat_data = flatten_place_data(details, CSV_HEADERS)
-                    writer.writerow(flat_data)
-                    print("OK")
-                else:
-                    error_count += 1
-                    print("Failed") # Error message printed in get_place_details
-
-                processed_count += 1
-                
-                # Add delay
-                time.sleep(API_DELAY_SECONDS)
+            # Submit lazily, keeping only a small window of requests queued, and handle
+            # results in input order. On any error (or Ctrl-C) the queued requests are
+            # cancelled so we don't keep paying for requests whose results are discarded.
+            ids_to_submit = iter(place_ids_to_fetch)
+            pending = deque()
+
+            def submit_next():
+                place_id = next(ids_to_submit, None)
+                if place_id is not None:
+                    pending.append((place_id, executor.submit(fetch_details_paced, place_id, fields_param)))
+
+            try:
+                for _ in range(workers * 2):
+                    submit_next()
+
+                while pending:
+                    place_id, future = pending.popleft()
+                    details, error = future.result()
+                    submit_next()
+
+                    print(f"Processing {processed_count + 1}/{total_ids}: {place_id} ... ", end='', flush=True)
+
+                    if details:
+                        flat_data = flatten_place_data(details, CSV_HEADERS)
+                        writer.writerow(flat_data)
+                        print("OK")
+                    else:
+                        error_count += 1
+                        print(f"Failed ({error})")
+
+                    processed_count += 1
+            except BaseException:
+                for _, future in pending:
+                    future.cancel()
+                raise
 
     except IOError as e:
         print(f"\nError writing to output file {output_file}: {e}")
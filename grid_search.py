@@ -5,6 +5,8 @@ import os
 import math
 import random
 import argparse
+import csv
+import glob
 from datetime import datetime
 from dotenv import load_dotenv
 from collections import deque
@@ -36,6 +38,16 @@ BASE_NEARBY_SEARCH_URL = "https://maps.googleapis.com/maps/api/place/nearbysearc
 GEOCODING_URL = "https://maps.googleapis.com/maps/api/geocode/json"
 PLACE_DETAILS_URL = "https://maps.googleapis.com/maps/api/place/details/json"
 
+# Directory holding one JSON file of place data per place ID
+DETAILED_DATA_DIR = "detailed_place_data"
+
+# Geocoded bounding boxes, keyed by location, reused across runs
+BOUNDS_CACHE_FILE = "bounding_box_cache.json"
+
+# Shared HTTP session so consecutive API calls reuse the same keep-alive
+# connection instead of paying a new TCP/TLS handshake per request
+HTTP_SESSION = requests.Session()
+
 # Use command line arguments if provided, otherwise use defaults
 TARGET_LOCATION = args.location
 PLACE_TYPE = args.place_type
@@ -74,6 +86,25 @@ TEST_AREAS = {
     }
 }
 
+# Pagination parameters
+PAGE_TOKEN_DELAY = 2  # Google's documented delay before a next_page_token becomes valid
+PAGE_TOKEN_RETRY_DELAY = 1  # Delay between retries while the token is still invalid
+PAGE_TOKEN_MAX_RETRIES = 3  # Retries before giving up on the remaining pages
+
+# Simulated density areas used by dry-run mock responses
+MOCK_DENSE_AREAS = (
+    {"center": (52.520008, 13.404954), "radius": 2000, "density": "high"},    # Alexanderplatz
+    {"center": (52.504556, 13.391794), "radius": 1500, "density": "medium"},  # Kreuzberg
+    {"center": (52.531, 13.386), "radius": 1200, "density": "high"},          # Mitte
+    {"center": (52.5182, 13.3765), "radius": 1800, "density": "medium"}       # Tiergarten
+)
+
+# Columns of the CSV summary built from detailed place data
+SUMMARY_CSV_HEADERS = (
+    "place_id", "name", "lat", "lng", "business_status",
+    "rating", "user_ratings_total", "vicinity", "types"
+)
+
 # API backoff parameters
 BASE_DELAY = 1.0  # Base delay in seconds
 MAX_DELAY = 60.0  # Maximum delay in seconds
@@ -82,6 +113,7 @@ CONSECUTIVE_ERRORS = 0
 
 # Global counters
 GLOBAL_API_CALLS = 0
+LAST_API_RESPONSE_TIME = 0.0  # time.monotonic() when the last API response arrived
 
 # Progress states
 POINT_STATE_PENDING = "pending"
@@ -90,6 +122,10 @@ POINT_STATE_COMPLETE = "complete"
 
 # Define global visualization data structure
 place_ids_with_coords = []  # Will store tuples of (place_id, lat, lng) for visualization
+visualized_place_ids = set()  # Place IDs already in place_ids_with_coords, for O(1) duplicate checks
+
+class APICallLimitReached(Exception):
+    """Raised when the --max-calls budget has been used up."""
 
 # Helper functions
 def calculate_max_distance_meters(bounds):
@@ -140,8 +176,57 @@ def meters_to_lng_degrees(meters, lat):
     # As we move away from the equator, this decreases by the cosine of the latitude
     return meters / (111320 * math.cos(math.radians(lat)))
 
+def spatial_cell(lat, lng, cell_lat_deg, cell_lng_deg):
+    """Return the (row, col) index of the spatial grid cell containing a point."""
+    return (math.floor(lat / cell_lat_deg), math.floor(lng / cell_lng_deg))
+
+def build_spatial_index(points, cell_lat_deg, cell_lng_deg):
+    """Bucket (lat, lng) points by spatial grid cell for fast proximity lookups."""
+    index = {}
+    for lat, lng in points:
+        index.setdefault(spatial_cell(lat, lng, cell_lat_deg, cell_lng_deg), []).append((lat, lng))
+    return index
+
+def is_near_indexed_point(lat, lng, index, cell_lat_deg, cell_lng_deg, threshold_meters):
+    """Check whether any indexed point lies within threshold_meters of (lat, lng).
+    
+    Cells must be at least threshold_meters wide, so only the 3x3 block of
+    cells around the point needs to be scanned.
+    """
+    row, col = spatial_cell(lat, lng, cell_lat_deg, cell_lng_deg)
+    for d_row in (-1, 0, 1):
+        for d_col in (-1, 0, 1):
+            for other_lat, other_lng in index.get((row + d_row, col + d_col), ()):
+                if haversine_distance(lat, lng, other_lat, other_lng) < threshold_meters:
+                    return True
+    return False
+
+def load_bounds_cache():
+    """Load previously geocoded bounding boxes from the cache file."""
+    try:
+        with open(BOUNDS_CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_bounds_cache(bounds_cache):
+    """Write geocoded bounding boxes to the cache file."""
+    try:
+        with open(BOUNDS_CACHE_FILE, 'w') as f:
+            json.dump(bounds_cache, f, indent=2)
+    except OSError as e:
+        print(f"Warning: could not write bounding box cache: {e}")
+
 def get_bounding_box(api_key, location):
-    """Get the bounding box for a location using the Google Maps Geocoding API."""
+    """Get the bounding box for a location using the Google Maps Geocoding API.
+    
+    Results are cached in BOUNDS_CACHE_FILE so resumed runs skip the geocoding call.
+    """
+    bounds_cache = load_bounds_cache()
+    if location in bounds_cache:
+        print(f"Using cached bounding box for {location}")
+        return tuple(bounds_cache[location])
+    
     print(f"Getting bounding box for {location}...")
     
     params = {
@@ -150,7 +235,7 @@ def get_bounding_box(api_key, location):
     }
     
     try:
-        response = requests.get(GEOCODING_URL, params=params)
+        response = HTTP_SESSION.get(GEOCODING_URL, params=params)
         data = response.json()
         
         if data["status"] != "OK":
@@ -165,7 +250,10 @@ def get_bounding_box(api_key, location):
         southwest = viewport["southwest"]
         
         # Return as (min_lat, min_lng, max_lat, max_lng)
-        return (southwest["lat"], southwest["lng"], northeast["lat"], northeast["lng"])
+        bounds = (southwest["lat"], southwest["lng"], northeast["lat"], northeast["lng"])
+        bounds_cache[location] = bounds
+        save_bounds_cache(bounds_cache)
+        return bounds
     except Exception as e:
         print(f"Error getting bounding box: {e}")
         return None
@@ -231,30 +319,18 @@ def generate_mock_response(lat, lng, radius, place_type, next_page_token=None):
     """Generate a realistic mock response based on location and simulated density."""
     
     # If next_page_token is provided, determine which pagination page we're on
+    # (mock tokens look like "mock_token_page_<page>_<timestamp>")
     if next_page_token:
-        if next_page_token.endswith("1"):
-            pagination_page = 1
-        elif next_page_token.endswith("2"):
-            pagination_page = 2
-        else:
-            pagination_page = int(next_page_token.split("_")[-1])
+        pagination_page = int(next_page_token.split("_")[3])
     else:
         pagination_page = 0
     
-    # Define test areas with more precise density information
-    dense_areas = [
-        {"center": (52.520008, 13.404954), "radius": 2000, "density": "high"},    # Alexanderplatz
-        {"center": (52.504556, 13.391794), "radius": 1500, "density": "medium"},  # Kreuzberg
-        {"center": (52.531, 13.386), "radius": 1200, "density": "high"},          # Mitte
-        {"center": (52.5182, 13.3765), "radius": 1800, "density": "medium"}       # Tiergarten
-    ]
-    
     # Determine density based on proximity to defined areas
-    area_density = "low"  # Default
+    area_density = None  # Set below, either by containing area or by distance falloff
     min_distance = float('inf')
     closest_area = None
     
-    for area in dense_areas:
+    for area in MOCK_DENSE_AREAS:
         distance = haversine_distance(lat, lng, area["center"][0], area["center"][1])
         if distance <= area["radius"]:
             # Within the defined area
@@ -314,7 +390,7 @@ def generate_mock_response(lat, lng, radius, place_type, next_page_token=None):
             next_token = f"mock_token_page_2_{int(time.time())}"
         else:
             # Random remaining results
-            max_second_page = int(15 * result_count_multiplier)
+            max_second_page = max(5, int(15 * result_count_multiplier))
             num_results = random.randint(5, max_second_page)
             next_token = None
     # Third page (if we should trigger refinement)
@@ -374,9 +450,21 @@ def generate_mock_response(lat, lng, radius, place_type, next_page_token=None):
             "next_page_token": next_token
         }
 
+def api_pause(seconds):
+    """Wait until at least `seconds` have passed since the last API response.
+    
+    Time already spent processing that response counts toward the pause.
+    Mock responses in dry run mode need no pacing.
+    """
+    if args.dry_run:
+        return
+    remaining = LAST_API_RESPONSE_TIME + seconds - time.monotonic()
+    if remaining > 0:
+        time.sleep(remaining)
+
 def perform_nearby_search(api_key, lat, lng, radius, place_type, next_page_token=None):
     """Perform a nearby search using the Google Maps Places API."""
-    global GLOBAL_API_CALLS, CONSECUTIVE_ERRORS, CURRENT_DELAY
+    global GLOBAL_API_CALLS, CONSECUTIVE_ERRORS, CURRENT_DELAY, LAST_API_RESPONSE_TIME
     
     # Check if we're in dry run mode
     if args.dry_run:
@@ -387,7 +475,7 @@ def perform_nearby_search(api_key, lat, lng, radius, place_type, next_page_token
     # Check API call limit if set
     if args.max_calls > 0 and GLOBAL_API_CALLS >= args.max_calls:
         print(f"\n*** Reached maximum API call limit of {args.max_calls}. Stopping. ***")
-        raise Exception("API call limit reached")
+        raise APICallLimitReached("API call limit reached")
         
     # Prepare request parameters
     if next_page_token:
@@ -409,7 +497,8 @@ def perform_nearby_search(api_key, lat, lng, radius, place_type, next_page_token
     GLOBAL_API_CALLS += 1
     
     try:
-        response = requests.get(BASE_NEARBY_SEARCH_URL, params=params)
+        response = HTTP_SESSION.get(BASE_NEARBY_SEARCH_URL, params=params)
+        LAST_API_RESPONSE_TIME = time.monotonic()
         data = response.json()
         
         # Handle rate limiting with exponential backoff
@@ -426,7 +515,7 @@ def perform_nearby_search(api_key, lat, lng, radius, place_type, next_page_token
             CURRENT_DELAY = max(BASE_DELAY, CURRENT_DELAY / 2)
             
         return data
-    except Exception as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"Error in nearby search: {e}")
         return {"status": "REQUEST_FAILED", "error_message": str(e)}
 
@@ -444,28 +533,26 @@ def process_search_results(data, all_place_ids, place_ids_this_point):
             if place_id not in all_place_ids:
                 newly_added_count += 1
                 
-            # Extract and save the full place data
-            save_detailed_place_data(place)
+                # Extract and save the full place data
+                # (known IDs were already written when first found at an overlapping point)
+                save_detailed_place_data(place)
     
     return newly_added_count, len(results)
 
 def save_detailed_place_data(place):
-    """Save comprehensive place data to a JSON file."""
-    # Ensure directory exists
-    detailed_data_dir = "detailed_place_data"
-    os.makedirs(detailed_data_dir, exist_ok=True)
-    
+    """Save comprehensive place data to a JSON file in DETAILED_DATA_DIR (created by main)."""
     place_id = place.get('place_id')
     if not place_id:
         return
         
     # Extract essential fields
+    location = place.get('geometry', {}).get('location', {})
     place_data = {
         "place_id": place_id,
         "name": place.get('name', ''),
         "location": {
-            "lat": place.get('geometry', {}).get('location', {}).get('lat', None),
-            "lng": place.get('geometry', {}).get('location', {}).get('lng', None)
+            "lat": location.get('lat', None),
+            "lng": location.get('lng', None)
         },
         "types": place.get('types', []),
         "business_status": place.get('business_status', ''),
@@ -476,60 +563,61 @@ def save_detailed_place_data(place):
     }
     
     # Save to JSON file with place_id as filename
-    output_file = os.path.join(detailed_data_dir, f"{place_id}.json")
+    output_file = os.path.join(DETAILED_DATA_DIR, f"{place_id}.json")
     with open(output_file, 'w') as f:
         json.dump(place_data, f, indent=2)
 
-def create_summary_csv(output_dir="detailed_place_data", target_location="", mode=""):
-    """Create a comprehensive CSV summary of all collected place data."""
-    import csv
-    import glob
+def create_summary_csv(output_dir=DETAILED_DATA_DIR, target_location="", mode="", place_ids=None):
+    """Create a comprehensive CSV summary of collected place data.
     
+    If place_ids is given, only those places are summarized; otherwise every
+    JSON file in output_dir is included.
+    """
     # Generate an appropriate filename
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     location_slug = target_location.split(',')[0].lower().replace(' ', '_') if target_location else "all"
     csv_filename = f"physiotherapist_summary_{location_slug}_{mode}_{timestamp}.csv"
     
-    # Define CSV headers
-    headers = [
-        "place_id", "name", "lat", "lng", "business_status", 
-        "rating", "user_ratings_total", "vicinity", "types"
-    ]
-    
     try:
-        # Get all JSON files in the directory
-        json_files = glob.glob(os.path.join(output_dir, "*.json"))
+        # Only read the files we need rather than everything saved by earlier searches
+        if place_ids is not None:
+            json_files = [os.path.join(output_dir, f"{place_id}.json") for place_id in sorted(place_ids)]
+        else:
+            json_files = glob.glob(os.path.join(output_dir, "*.json"))
         
         if not json_files:
             print("No detailed place data found to summarize.")
             return
         
-        # Write to CSV
+        # Transform data for CSV
+        csv_rows = []
+        for json_file in json_files:
+            try:
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    place_data = json.load(f)
+                    
+                location = place_data.get("location", {})
+                csv_rows.append({
+                    "place_id": place_data.get("place_id", ""),
+                    "name": place_data.get("name", ""),
+                    "lat": location.get("lat", ""),
+                    "lng": location.get("lng", ""),
+                    "business_status": place_data.get("business_status", ""),
+                    "rating": place_data.get("rating", ""),
+                    "user_ratings_total": place_data.get("user_ratings_total", ""),
+                    "vicinity": place_data.get("vicinity", ""),
+                    "types": "|".join(place_data.get("types", []))
+                })
+            except FileNotFoundError:
+                continue  # No detailed data saved for this place
+            except Exception as e:
+                print(f"Error processing {json_file}: {e}")
+        
+        # Write to CSV in a single batch
         with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=headers)
+            writer = csv.DictWriter(csvfile, fieldnames=SUMMARY_CSV_HEADERS)
             writer.writeheader()
-            
-            for json_file in json_files:
-                try:
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        place_data = json.load(f)
-                        
-                    # Transform data for CSV
-                    csv_row = {
-                        "place_id": place_data.get("place_id", ""),
-                        "name": place_data.get("name", ""),
-                        "lat": place_data.get("location", {}).get("lat", ""),
-                        "lng": place_data.get("location", {}).get("lng", ""),
-                        "business_status": place_data.get("business_status", ""),
-                        "rating": place_data.get("rating", ""),
-                        "user_ratings_total": place_data.get("user_ratings_total", ""),
-                        "vicinity": place_data.get("vicinity", ""),
-                        "types": "|".join(place_data.get("types", []))
-                    }
-                    
-                    writer.writerow(csv_row)
-                except Exception as e:
-                    print(f"Error processing {json_file}: {e}")
+            writer.writerows(csv_rows)
         
         print(f"CSV summary created: {csv_filename}")
         return csv_filename
@@ -571,12 +659,21 @@ def perform_search_at_point(point_coords, radius, all_place_ids, output_file):
         # Process additional pages if available
         while next_page_token:
             # Wait before requesting the next page (required by Google)
-            time.sleep(2)
+            api_pause(PAGE_TOKEN_DELAY)
             
             data = perform_nearby_search(API_KEY, lat, lng, radius, PLACE_TYPE, next_page_token)
             api_calls += 1
             pagination_count += 1
             
+            # The token may not be valid yet - poll briefly instead of dropping the remaining pages
+            retries = 0
+            while data.get('status') == 'INVALID_REQUEST' and retries < PAGE_TOKEN_MAX_RETRIES:
+                retries += 1
+                print(f"Page token not ready yet, retrying ({retries}/{PAGE_TOKEN_MAX_RETRIES})...")
+                api_pause(PAGE_TOKEN_RETRY_DELAY)
+                data = perform_nearby_search(API_KEY, lat, lng, radius, PLACE_TYPE, next_page_token)
+                api_calls += 1
+            
             if data.get('status') == 'OK':
                 newly_added, results_count = process_search_results(data, all_place_ids, place_ids_this_point)
                 total_results += results_count
@@ -598,7 +695,7 @@ def perform_search_at_point(point_coords, radius, all_place_ids, output_file):
     
     elif status == 'OVER_QUERY_LIMIT':
         print("WARNING: Exceeded query limit. Waiting to retry...")
-        time.sleep(60)  # Wait for quota to reset
+        api_pause(60)  # Wait for quota to reset
         return perform_search_at_point(point_coords, radius, all_place_ids, output_file)  # Retry
     
     else:
@@ -614,7 +711,7 @@ def perform_search_at_point(point_coords, radius, all_place_ids, output_file):
 
 def extract_place_coordinates(data):
     """Extract coordinates from place results for visualization."""
-    global place_ids_with_coords
+    global place_ids_with_coords, visualized_place_ids
     
     try:
         for place in data.get('results', []):
@@ -624,7 +721,8 @@ def extract_place_coordinates(data):
                 place_lng = place['geometry']['location']['lng']
                 
                 # Only add if this place_id isn't already in our visualization data
-                if not any(pid == place_id for pid, _, _ in place_ids_with_coords):
+                if place_id not in visualized_place_ids:
+                    visualized_place_ids.add(place_id)
                     place_ids_with_coords.append((place_id, place_lat, place_lng))
             else:
                 print("Warning: Place data missing geometry information")
@@ -644,15 +742,14 @@ def perform_refined_search_at_point(point_coords, radius, all_place_ids, output_
 
 def save_place_ids(new_place_ids, all_place_ids, output_file):
     """Save new place IDs to the output file."""
-    saved_count = 0
-    with open(output_file, 'a') as f:
-        for place_id in new_place_ids:
-            if place_id not in all_place_ids:  # Only save IDs not already saved
-                f.write(f"{place_id}\n")
-                all_place_ids.add(place_id)  # Update the set
-                saved_count += 1
+    # Only save IDs not already saved, written in a single batch
+    unsaved_ids = [place_id for place_id in new_place_ids if place_id not in all_place_ids]
+    saved_count = len(unsaved_ids)
     
     if saved_count > 0:
+        with open(output_file, 'a') as f:
+            f.writelines(f"{place_id}\n" for place_id in unsaved_ids)
+        all_place_ids.update(unsaved_ids)  # Update the set
         print(f"Saved {saved_count} new place IDs to {output_file}")
 
 def save_progress_point(point_coords, grid_type, state, progress_file, timestamp=None):
@@ -670,8 +767,8 @@ def load_progress(progress_file, output_file):
     all_place_ids = set()
     searched_mini_areas = set()  # Mini areas already searched (for overlap mitigation)
     
-    # Load processed points
-    if os.path.exists(progress_file):
+    # Load processed points (the file does not exist yet on a fresh run)
+    try:
         with open(progress_file, 'r') as f:
             for line in f:
                 parts = line.strip().split(',')
@@ -687,14 +784,15 @@ def load_progress(progress_file, output_file):
                     # Track mini-grid points for overlap mitigation
                     if grid_type == "mini":
                         searched_mini_areas.add((round(lat, 6), round(lng, 6)))
+    except FileNotFoundError:
+        pass
     
-    # Load all place IDs found
-    if os.path.exists(output_file):
+    # Load all place IDs found (one per line; split() also drops blank lines)
+    try:
         with open(output_file, 'r') as f:
-            for line in f:
-                place_id = line.strip()
-                if place_id:
-                    all_place_ids.add(place_id)
+            all_place_ids.update(f.read().split())
+    except FileNotFoundError:
+        pass
     
     print(f"Loaded {len(completed_points)} completed points, {len(refining_points)} refining points, and {len(all_place_ids)} unique place IDs.")
     return completed_points, refining_points, searched_mini_areas, all_place_ids
@@ -729,27 +827,27 @@ def visualize_search_results(grid_points, refinement_points, place_ids_with_coor
         {'grid': 'lightblue', 'refinement': 'pink', 'places': 'lightgreen'}
     ]
     
-    # Determine map center based on all data
-    all_points = []
-    if grid_points:
-        all_points.extend(grid_points)
-    if place_ids_with_coords:
-        all_points.extend([(lat, lng) for _, lat, lng in place_ids_with_coords])
-    
-    # Add points from additional datasets if provided
+    # Determine map center based on all data, including additional datasets if provided
+    datasets = [(grid_points, place_ids_with_coords)]
     if additional_map_data:
-        for dataset_idx, (add_grid, add_refine, add_places) in enumerate(additional_map_data):
-            if add_grid:
-                all_points.extend(add_grid)
-            if add_places:
-                all_points.extend([(lat, lng) for _, lat, lng in add_places])
+        datasets.extend((add_grid, add_places) for add_grid, _, add_places in additional_map_data)
+    
+    # Accumulate running sums in a single pass instead of building a combined point list
+    lat_sum, lng_sum, point_count = 0.0, 0.0, 0
+    for dataset_grid, dataset_places in datasets:
+        for lat, lng in dataset_grid or []:
+            lat_sum += lat
+            lng_sum += lng
+            point_count += 1
+        for _, lat, lng in dataset_places or []:
+            lat_sum += lat
+            lng_sum += lng
+            point_count += 1
     
     # Choose center point
-    if all_points:
+    if point_count:
         # Calculate center of all points
-        avg_lat = sum(lat for lat, _ in all_points) / len(all_points)
-        avg_lng = sum(lng for _, lng in all_points) / len(all_points)
-        center_lat, center_lng = avg_lat, avg_lng
+        center_lat, center_lng = lat_sum / point_count, lng_sum / point_count
     else:
         # Default to Berlin center
         center_lat, center_lng = 52.52, 13.41
@@ -925,9 +1023,10 @@ def test_parameter_sensitivity(test_area):
                     MINI_RADIUS_FACTOR = factor
                     
                     # Reset counters for this test
-                    global GLOBAL_API_CALLS, place_ids_with_coords
+                    global GLOBAL_API_CALLS, place_ids_with_coords, visualized_place_ids
                     GLOBAL_API_CALLS = 0
                     place_ids_with_coords = []  # Reset visualization data for each test
+                    visualized_place_ids = set()
                     start_time = time.time()
                     
                     # Run the search on this test area with limited grid size
@@ -1006,11 +1105,10 @@ def test_parameter_sensitivity(test_area):
                     finally:
                         # Clean up temporary files
                         for f in [test_progress_file, test_output_file, test_refinement_log]:
-                            if os.path.exists(f):
-                                try:
-                                    os.remove(f)
-                                except:
-                                    pass
+                            try:
+                                os.remove(f)
+                            except OSError:
+                                pass
         
         # Print results table
         print("\nParameter Sensitivity Results (LIMITED SAMPLE SIZE):")
@@ -1053,8 +1151,9 @@ def test_parameter_sensitivity(test_area):
 # --- Main Function ---
 def main():
     # Initialize global visualization data
-    global place_ids_with_coords
+    global place_ids_with_coords, visualized_place_ids
     place_ids_with_coords = []
+    visualized_place_ids = set()
     
     # Special case: Combine existing maps
     if args.combine_maps:
@@ -1103,6 +1202,9 @@ def main():
     print("--- Starting Place ID Extraction with Adaptive Refinement ---")
     print(f"Mode: {'DRY RUN (mock responses)' if args.dry_run else 'LIVE'}")
     
+    # Ensure detailed data directory exists (once, rather than for every saved place)
+    os.makedirs(DETAILED_DATA_DIR, exist_ok=True)
+    
     # Special case: Parameter sensitivity testing
     if args.param_test:
         test_area = args.test_area or "alexanderplatz"
@@ -1131,7 +1233,6 @@ def main():
     # Ensure output directories exist
     os.makedirs(os.path.dirname(PROGRESS_FILE) if os.path.dirname(PROGRESS_FILE) else '.', exist_ok=True)
     os.makedirs(os.path.dirname(OUTPUT_FILE) if os.path.dirname(OUTPUT_FILE) else '.', exist_ok=True)
-    os.makedirs("detailed_place_data", exist_ok=True)  # Ensure detailed data directory exists
     
     try:
         # Load progress from previous runs
@@ -1154,6 +1255,14 @@ def main():
         # Generate the initial grid points
         grid_points = generate_grid_points(bounds, INITIAL_GRID_STEP)
         
+        # Index searched mini-grid areas so the overlap check only looks at nearby ones.
+        # Cells are sized from the proximity threshold (with a small margin for the
+        # degree approximations, and at the highest latitude where longitude degrees are widest)
+        proximity_threshold = (INITIAL_RADIUS / MINI_RADIUS_FACTOR) * 0.5  # Half the mini radius
+        cell_lat_deg = meters_to_lat_degrees(proximity_threshold) * 1.05
+        cell_lng_deg = meters_to_lng_degrees(proximity_threshold, max(abs(bounds[0]), abs(bounds[2])) + 0.1) * 1.05
+        searched_mini_index = build_spatial_index(searched_mini_areas, cell_lat_deg, cell_lng_deg)
+        
         # Track points for visualization
         processed_grid_points = []
         refinement_points = []
@@ -1221,7 +1330,6 @@ def main():
                             # Log the refinement
                             if not in_refining_state:  # Only log if not already in refinement state
                                 refinement_log.write(f"{lat},{lng},{results_count},{INITIAL_RADIUS}\n")
-                                refinement_log.flush()
                                 
                                 # Mark this point as being in refinement
                                 save_progress_point(point_coords, "standard", POINT_STATE_REFINING, PROGRESS_FILE)
@@ -1245,7 +1353,7 @@ def main():
                                 # Check for API call limit
                                 if args.max_calls > 0 and GLOBAL_API_CALLS >= args.max_calls:
                                     print(f"Reached maximum API call limit during refinement. Stopping.")
-                                    raise Exception("API call limit reached during refinement")
+                                    raise APICallLimitReached("API call limit reached during refinement")
                                 
                                 # Skip if already processed
                                 if (mini_lat, mini_lng, "mini") in completed_points:
@@ -1253,16 +1361,9 @@ def main():
                                     continue
                                 
                                 # OPTIMIZATION: Skip if too close to another already processed mini-point
-                                proximity_threshold = mini_radius * 0.5  # Half the mini radius
-                                skip_point = False
-                                
-                                for searched_lat, searched_lng in searched_mini_areas:
-                                    if haversine_distance(mini_lat, mini_lng, searched_lat, searched_lng) < proximity_threshold:
-                                        print(f"   Skipping mini-point {j+1}/{len(mini_grid_points)} - too close to previously searched area")
-                                        skip_point = True
-                                        break
-                                        
-                                if skip_point:
+                                if is_near_indexed_point(mini_lat, mini_lng, searched_mini_index,
+                                                         cell_lat_deg, cell_lng_deg, proximity_threshold):
+                                    print(f"   Skipping mini-point {j+1}/{len(mini_grid_points)} - too close to previously searched area")
                                     continue
                                 
                                 print(f"   Processing mini-point {j+1}/{len(mini_grid_points)}: ({mini_lat:.6f}, {mini_lng:.6f})")
@@ -1277,12 +1378,15 @@ def main():
                                 
                                 # Add to searched areas for overlap mitigation
                                 searched_mini_areas.add((mini_lat, mini_lng))
+                                searched_mini_index.setdefault(
+                                    spatial_cell(mini_lat, mini_lng, cell_lat_deg, cell_lng_deg), []
+                                ).append((mini_lat, mini_lng))
                                 
                                 # Track for visualization
                                 refinement_points.append(mini_point)
                                 
                                 # Small delay between mini-grid calls
-                                time.sleep(0.5)
+                                api_pause(0.5)
                             
                             print(f"*** Refinement complete. Made {mini_grid_api_calls} additional API calls.")
                             refinements_triggered += 1
@@ -1293,6 +1397,9 @@ def main():
                             # No refinement needed, mark as complete
                             save_progress_point(point_coords, "standard", POINT_STATE_COMPLETE, PROGRESS_FILE)
                     
+                    except APICallLimitReached as e:
+                        print(f"Stopping at point {point_coords}: {e}")
+                        break
                     except Exception as e:
                         print(f"Error processing point {point_coords}: {e}")
                         print("Continuing with next point...")
@@ -1308,7 +1415,7 @@ def main():
                     print(f"  - Refinements Triggered: {refinements_triggered}")
                     
                     # Be nice to Google's API - wait between grid points
-                    time.sleep(1)
+                    api_pause(1)
                     
             except Exception as e:
                 print(f"\n*** ERROR IN MAIN PROCESSING LOOP: {e} ***")
@@ -1347,10 +1454,11 @@ def main():
         print(f"  - Refinements Triggered: {refinements_triggered}")
         print(f"\nResults saved to {OUTPUT_FILE}")
         
-        # Create CSV summary of all places
+        # Create CSV summary of the places found by this search
         csv_file = create_summary_csv(
             target_location=TARGET_LOCATION if not args.test_area else TEST_AREAS.get(args.test_area, {}).get("name", ""),
-            mode=mode_slug
+            mode=mode_slug,
+            place_ids=all_place_ids
         )
         if csv_file:
             print(f"CSV summary saved to {csv_file}")